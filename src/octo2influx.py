@@ -1,19 +1,31 @@
 #!/usr/bin/python3
 
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client import query_api
-from influxdb_client.client.write_api import SYNCHRONOUS
-import dateutil.parser
+from influxdb_client import InfluxDBClient, WritePrecision
+from influxdb_client.client import query_api, write_api
+from influxdb_client.client.write_api import WriteOptions
 from datetime import date, datetime, timedelta, timezone
-import pytz
 import requests
+try:
+    # Optional, but decodes the (large) Octopus API responses much faster than json:
+    import orjson
+except ImportError:
+    orjson = None
+from requests.adapters import HTTPAdapter
 from urllib import parse
 from urllib3 import Retry
+from zoneinfo import ZoneInfo
 import argparse
+import functools
 import confuse
+import diskcache
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from os import path
 import logging
+import math
+import re
+import threading
 
 PROGNAME = 'octo2influx'
 
@@ -55,6 +67,14 @@ def _secret_unsafe_on_cmdline(val: str):
         'Do not set secrets on the command line as it is not safe: they may be recorded in your shell history, system audit, etc. Use a access-restricted configuration file, or environment variables (e.g. when using Docker Compose).')
 
 
+def _bool(val: str) -> bool:
+    if val.lower() in ['true', 'yes', '1']:
+        return True
+    if val.lower() in ['false', 'no', '0']:
+        return False
+    raise argparse.ArgumentTypeError(f"invalid boolean value: '{val}'")
+
+
 def _config_only(val: str):
     raise argparse.ArgumentTypeError(
         'this config key is only supported in a configuration file.')
@@ -74,6 +94,8 @@ params = {
     'price_types': Parameter(_config_only, confuse.MappingValues(str), '(**Config only**) List of price types to retrieve using the Octopus API, and their units.'),
     'usage': Parameter(_config_only, confuse.Sequence(confuse_usage_template), '(**Config only**) List of Octopus usage (electricity/gas import consumption, or export) to retrieve using the Octopus API.'),
     'tariffs': Parameter(_config_only, confuse.Sequence(confuse_tariff_template), '(**Config only**) List of Octopus tariffs to retrieve using the Octopus API.'),
+    'octopus_cache': Parameter(_bool, bool, f'Cache the Octopus API responses for past periods (which do not change anymore) on disk, in ~/.cache/{PROGNAME}.', default=True),
+    'octopus_concurrency': Parameter(int, int, 'Maximum number of queries to the Octopus API to run concurrently.', default=8, validator=lambda x: x >= 1),
 
     # Influx settings:
     'influx_org': Parameter(str, str, 'InfluxDB 2.X organization name to store the data into.'),
@@ -144,42 +166,209 @@ def get_url_of_consumption(base_url: str, usage: confuse.templates.AttrDict) ->
     return f"{base_url}/{usage.energy_type}-meter-points/{usage.meter_point}/meters/{usage.meter_serial}/consumption/"
 
 
-def retrieve_paginated_data(
-        api_key, url, from_iso8601, to_iso8601, page=None
-):
+def build_session(pool_maxsize: int = 16) -> requests.Session:
+    """Return a requests.Session reusing its connections, and retrying on transient errors."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize,
+                          max_retries=Retry(total=5, backoff_factor=0.7,
+                                            status_forcelist=(429, 500, 502, 503, 504)))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# Shared by all the queries to the Octopus API, so they reuse the same
+# connections (and TLS sessions) rather than opening new ones for each page
+# (rebuilt with a pool as large as octopus_concurrency when run as a script):
+SESSION = build_session()
+
+
+# Largest page sizes allowed by the Octopus API (it defaults to 100 results),
+# so a query needs as few pages, and thus requests, as possible:
+CONSUMPTION_PAGE_SIZE = 25_000
+TARIFF_PAGE_SIZE = 1_500
+
+# The progress dots are flushed to stdout every this many pages:
+PROGRESS_FLUSH_PAGES = 10
+
+# Octopus may still add (e.g. late consumption) data to recent periods, so only
+# the responses for periods which ended before that are cached:
+CACHE_AFTER = timedelta(days=2)
+
+# Set to a diskcache.Cache to cache the responses of the Octopus API:
+CACHE = None
+
+
+def period_is_final(to_iso8601: str, now: datetime = None) -> bool:
+    """Return whether the Octopus data up to to_iso8601 will not change anymore.
+
+    now defaults to the current time, and can be given e.g. for testing.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    return datetime_from_iso8601(to_iso8601) < now - CACHE_AFTER
+
+
+def get_page(api_key: str, url: str, args: dict) -> dict:
+    """Return a page of results of the Octopus API, from CACHE if possible."""
+    use_cache = CACHE is not None and period_is_final(args['period_to'])
+    if use_cache:
+        # The API key is not part of the key, so it is not stored in the cache:
+        key = (url, *sorted(args.items()))
+        data = CACHE.get(key)
+        if data is not None:
+            return data
+
+    response = SESSION.get(url, params=args, auth=(api_key, ''), timeout=(5, 30))
+    response.raise_for_status()
+    data = orjson.loads(response.content) if orjson else response.json()
+    if use_cache:
+        CACHE.set(key, data)
+    return data
+
+
+def iter_paginated_data(api_key: str, url: str, from_iso8601: str, to_iso8601: str,
+                        reverse: bool = False, **extra_args) -> Iterator[dict]:
+    """Yield the results of a paginated Octopus API query, one page at a time.
+
+    Only the current page is held in memory, so the results can be processed
+    while the next pages are being retrieved.
+
+    Args:
+      reverse: yield the results in the reverse order of the API, e.g. from
+        oldest to newest for the prices. This requires retrieving all the pages
+        before yielding any result.
+      extra_args: additional query parameters, e.g. order_by or page_size
+    """
     args = {
         'period_from': from_iso8601,
         'period_to': to_iso8601,
+        **extra_args,
     }
-    if page:
-        args['page'] = page
-    else:
-        if cfg['loglevel'] in ['INFO', 'DEBUG']:
-            # logging expects full messages, not dot progress, so we print() instead:
-            print('    progress (one dot per page) ', end='', flush=True)
-    response = requests.get(url, params=args, auth=(api_key, ''))
-    response.raise_for_status()
-    data = response.json()
-    results = data.get('results', [])
-    if cfg['loglevel'] in ['INFO', 'DEBUG']:
-        print('.', end='', flush=True)
-    if data['next']:
+    # The data may be retrieved concurrently so, rather than a progress line per
+    # query, we only print one dot per page (logging expects full messages, not
+    # dot progress, so we print() instead). stdout is only flushed every few
+    # pages, and on the last one:
+    show_progress = logging.root.isEnabledFor(logging.INFO)
+    pages = []
+    pages_count = 0
+    while True:
+        data = get_page(api_key, url, args)
+        pages_count += 1
+        if show_progress:
+            print('.', end='', flush=not data['next'] or pages_count % PROGRESS_FLUSH_PAGES == 0)
+        if reverse:
+            pages.append(data.get('results', []))
+        else:
+            yield from data.get('results', [])
+        if not data['next']:
+            break
         url_query = parse.urlparse(data['next']).query
-        next_page = parse.parse_qs(url_query)['page'][0]
-        results += retrieve_paginated_data(
-            api_key, url, from_iso8601, to_iso8601, next_page
-        )
-    if not page and cfg['loglevel'] in ['INFO', 'DEBUG']:
-        print('\n', end='', flush=True)
-    return results
+        args['page'] = parse.parse_qs(url_query)['page'][0]
+
+    for results in reversed(pages):
+        yield from reversed(results)
+
+
+def retrieve_paginated_data(api_key: str, url: str, from_iso8601: str, to_iso8601: str,
+                            reverse: bool = False, **extra_args) -> list[dict]:
+    """Return all the results of a paginated Octopus API query."""
+    return list(iter_paginated_data(api_key, url, from_iso8601, to_iso8601, reverse, **extra_args))
+
+
+def tariff_tags(tariff: confuse.templates.AttrDict, price_type: str) -> dict[str, str]:
+    """Return the InfluxDB tags of the points of a tariff's price type."""
+    return {
+        "energy_type": tariff.energy_type,
+        "direction": tariff.direction,
+        "tariff_code": tariff.tariff_code,
+        "price_type": price_type,
+        "product_code": tariff.product_code,
+        "display_name": tariff.display_name,
+    }
+
+
+def usage_tags(usage: confuse.templates.AttrDict) -> dict[str, str]:
+    """Return the InfluxDB tags of the points of a usage."""
+    return {
+        "energy_type": usage.energy_type,
+        "direction": usage.direction,
+        "meter_point": usage.meter_point,
+        "meter_serial": usage.meter_serial,
+    }
+
+
+# Characters to escape in InfluxDB line protocol, see
+# https://docs.influxdata.com/influxdb/v2/reference/syntax/line-protocol/#special-characters
+_ESCAPE_MEASUREMENT = str.maketrans({',': r'\,', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_ESCAPE_KEY = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_DAY_NS = 86_400 * 1_000_000_000
+_ONE_SECOND = timedelta(seconds=1)
+_ZERO = timedelta(0)
+
+
+def _escape_tag_value(value: str) -> str:
+    escaped = value.translate(_ESCAPE_KEY)
+    # Like the Influx client, a trailing backslash would escape the following
+    # comma or space, so it is followed by a space:
+    if escaped.endswith('\\'):
+        escaped += ' '
+    return escaped
+
+
+def line_protocol_prefix(measurement: str, tags: dict[str, str]) -> str:
+    """Return the measurement and tags of InfluxDB points in line protocol (e.g. 'measurement,tag1=a,tag2=b')."""
+    escaped_tags = [f"{key.translate(_ESCAPE_KEY)}={_escape_tag_value(value)}"
+                    for key, value in sorted(tags.items()) if value]
+    return ','.join([measurement.translate(_ESCAPE_MEASUREMENT)] + escaped_tags)
+
+
+# The series of a point in line protocol is up to the first unescaped space:
+_SERIES_RE = re.compile(r'(?:[^ \\]|\\.)*')
+
 
+def series_of_point(point: str) -> str:
+    """Return the series (measurement and tags) of a point in line protocol."""
+    return _SERIES_RE.match(point).group()
 
-def std_unit_rate_to_points(measurement: str, row: dict, price_type: str, unit: str, tariff: confuse.templates.AttrDict, from_dt: datetime, to_dt: datetime) -> list[Point]:
-    """Convert a single Octopus API rate datapoint into multiple InfluxDB points for easier querying and charting.
+
+def line_protocol_field(key: str, value: float) -> str:
+    """Return a float field of an InfluxDB point in line protocol.
+
+    Like the Influx client, return an empty string for a missing (None) or
+    non-finite value, which Influx would reject: the field is then skipped.
+    """
+    if value is None:
+        return ''
+    # Values are stored as floats even if Octopus returns whole numbers, as
+    # Influx rejects points whose field changes from/to integer.
+    value = float(value)
+    if not math.isfinite(value):
+        return ''
+    s = str(value)
+    # Like the Influx client, drop the superfluous ".0" of whole numbers:
+    if s.endswith('.0'):
+        s = s[:-2]
+    return f"{key.translate(_ESCAPE_KEY)}={s}"
+
+
+def nanoseconds_from_datetime(dt: datetime) -> int:
+    """Return the number of nanoseconds since the epoch of a datetime, InfluxDB's default time precision."""
+    return (dt - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def std_unit_rate_to_points(measurement: str, row: dict, price_type: str, unit: str, tariff: confuse.templates.AttrDict, from_dt: datetime, to_dt: datetime,
+                            prefix: str = None) -> list[str]:
+    """Convert a single Octopus API rate datapoint into multiple InfluxDB points (in line protocol) for easier querying and charting.
 
     Given an Octopus datapoint:
     - if the price has an expiry date: add two influxdb points at times _valid_from and _valid_to-1s.
     - otherwise add one influxdb point per day
+
+    The prefix can be given if already computed with line_protocol_prefix(), as
+    it is the same for all the datapoints of a tariff's price type.
     """
 
     # Example data from the Octopus API:
@@ -200,49 +389,59 @@ def std_unit_rate_to_points(measurement: str, row: dict, price_type: str, unit:
     #     }
     # ]
 
-    def rate2point(tstamp: datetime) -> Point:
-        return Point(measurement)\
-            .tag("energy_type", tariff.energy_type)\
-            .tag("direction", tariff.direction)\
-            .tag("tariff_code", tariff.tariff_code)\
-            .tag("price_type", price_type)\
-            .tag("product_code", tariff.product_code)\
-            .tag("display_name", tariff.display_name)\
-            .field(f"{unit}_inc_vat", row["value_inc_vat"])\
-            .field(f"{unit}_exc_vat", row["value_exc_vat"])\
-            .time(tstamp)
+    if prefix is None:
+        prefix = line_protocol_prefix(measurement, tariff_tags(tariff, price_type))
+    # The fields are the same for all the points of the datapoint:
+    fields = ','.join(filter(None, [line_protocol_field(f"{unit}_exc_vat", row["value_exc_vat"]),
+                                    line_protocol_field(f"{unit}_inc_vat", row["value_inc_vat"])]))
+    if not fields:
+        # Influx rejects points without any field:
+        return []
+
+    valid_to = to_dt
+    if "valid_to" in row and row["valid_to"]:
+        valid_to = datetime_from_iso8601(row["valid_to"]) - _ONE_SECOND
+        # Nothing to write for a price which expired before from_dt (any point
+        # would either be at from_dt with an expired price, or before from_dt):
+        if valid_to < from_dt:
+            return []
 
     valid_from = from_dt
     if "valid_from" in row and row["valid_from"]:
-        point_valid_from = dateutil.parser.isoparse(row["valid_from"])
+        point_valid_from = datetime_from_iso8601(row["valid_from"])
         # Don't allow points older than from_dt or it might go beyond the Influxdb retention and error:
         if point_valid_from > from_dt:
             valid_from = point_valid_from
 
-    valid_to = to_dt
-    if "valid_to" in row and row["valid_to"]:
-        valid_to = dateutil.parser.isoparse(
-            row["valid_to"])-timedelta(seconds=1)
-
-    to_nextday_dt = valid_to + timedelta(days=1)
+    # The timestamps are computed as nanoseconds, Influx's precision, once for all:
+    valid_to_ns = nanoseconds_from_datetime(valid_to)
+    oldest_ns = nanoseconds_from_datetime(from_dt) - _ONE_DAY_NS
+    cur_ns = nanoseconds_from_datetime(valid_from)
+    # The following points are at the start of each day:
+    next_ns = nanoseconds_from_datetime(
+        valid_from.replace(hour=0, minute=0, second=0, microsecond=0)) + _ONE_DAY_NS
     points = []
-    cur_dt = valid_from
-    while cur_dt < to_nextday_dt:
-        if cur_dt >= from_dt - timedelta(days=1):
-            points.append(rate2point(cur_dt))
+    while cur_ns < valid_to_ns + _ONE_DAY_NS:
+        if cur_ns >= oldest_ns:
+            points.append(f"{prefix} {fields} {cur_ns}")
 
-        cur_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        cur_dt += timedelta(days=1)
+        cur_ns = next_ns
+        next_ns += _ONE_DAY_NS
 
-        if cur_dt > valid_to:
-            points.append(rate2point(valid_to))
+        if cur_ns > valid_to_ns:
+            points.append(f"{prefix} {fields} {valid_to_ns}")
             break
 
     return points
 
 
-def consumption_to_point(measurement: str, row: dict, usage: confuse.templates.AttrDict) -> Point:
-    """Convert a single Octopus API usage datapoint into an InfluxDB point."""
+def consumption_to_point(measurement: str, row: dict, usage: confuse.templates.AttrDict,
+                         prefix: str = None) -> str:
+    """Convert a single Octopus API usage datapoint into an InfluxDB point, in line protocol.
+
+    The prefix can be given if already computed with line_protocol_prefix(), as
+    it is the same for all the datapoints of a usage.
+    """
     # Example data from the Octopus API:
     # data=[
     # {'consumption': 0.001, 'interval_start': '2023-07-31T00:30:00+01:00', 'interval_end': '2023-07-31T01:00:00+01:00'},
@@ -250,41 +449,96 @@ def consumption_to_point(measurement: str, row: dict, usage: confuse.templates.A
     # {'consumption': 0.0, 'interval_start': '2023-07-30T23:30:00+01:00', 'interval_end': '2023-07-31T00:00:00+01:00'},
     # ...
     # ]
-    interval_start = dateutil.parser.isoparse(row["interval_start"])
-    interval_end = dateutil.parser.isoparse(row["interval_end"])
+    if prefix is None:
+        prefix = line_protocol_prefix(measurement, usage_tags(usage))
+    interval_start = datetime_from_iso8601(row["interval_start"])
+    interval_end = datetime_from_iso8601(row["interval_end"])
     mid_dt = interval_start + (interval_end - interval_start) / 2
-    return Point(measurement) \
-        .tag("energy_type", usage.energy_type)\
-        .tag("direction", usage.direction)\
-        .tag("meter_point", usage.meter_point)\
-        .tag("meter_serial", usage.meter_serial)\
-        .field("interval_start", interval_start.timestamp())\
-        .field("interval_end", interval_end.timestamp())\
-        .field(usage.unit, row["consumption"])\
-        .time(mid_dt)
+    # (the interval fields are always there, even if the consumption is missing)
+    fields = ','.join(filter(None, [
+        line_protocol_field("interval_end", interval_end.timestamp()),
+        line_protocol_field("interval_start", interval_start.timestamp()),
+        line_protocol_field(usage.unit, row["consumption"]),
+    ]))
+    return f"{prefix} {fields} {nanoseconds_from_datetime(mid_dt)}"
 
 
 def iso8601_from_datetime(dt: datetime) -> str:
-    """Convert a datetime into its iso8601 string representation."""
-    dt_utc = dt.astimezone(pytz.utc)
-    # We drop the timezone so there is no time offset +HH:MM suffix:
-    return f"{dt_utc.replace(tzinfo=None).isoformat(timespec='seconds')}Z"
+    """Convert a datetime into its iso8601 string representation, in UTC."""
+    if dt.utcoffset() != _ZERO:
+        dt = dt.astimezone(timezone.utc)
+    # We format with a "Z" suffix rather than a +00:00 time offset:
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def datetime_from_iso8601(iso8601: str) -> datetime:
+    """Convert an iso8601 string from the Octopus API into a datetime."""
+    # datetime.fromisoformat() is much faster than dateutil, but only supports
+    # the "Z" (UTC) suffix from Python 3.11:
+    if iso8601.endswith('Z'):
+        iso8601 = iso8601[:-1] + '+00:00'
+    return datetime.fromisoformat(iso8601)
+
+
+@functools.lru_cache(maxsize=1)
+def local_timezone() -> ZoneInfo:
+    """Return the configured timezone, resolved once (on first use)."""
+    return ZoneInfo(cfg['timezone'])
+
 
+def datetime_days_ago(days_ago: int, time_of_day: datetime.time, now: datetime = None) -> datetime:
+    """Return the timestamp of days_ago days ago from today at time_of_day.
+
+    Today is the date of now (default: the current time) in the configured timezone.
+    """
+    tz = local_timezone()
+    now = datetime.now(tz=tz) if now is None else now.astimezone(tz)
+    d = now.date() - timedelta(days=days_ago)
+    return datetime.combine(d, time_of_day, tzinfo=tz)
 
-def datetime_days_ago(days_ago: int, time_of_day: datetime.time) -> datetime:
-    """Return the timestamp of days_ago days ago from today at time_of_day."""
-    d = datetime.now().date() - timedelta(days=days_ago)
-    return pytz.timezone(cfg['timezone']).localize(datetime.combine(d, time_of_day))
 
+def days_ago_from_datetime(dt: datetime, now: datetime = None) -> int:
+    """Return how many days ago (default: from the current time) dt is, in the configured timezone."""
+    tz = local_timezone()
+    now = datetime.now(tz=tz) if now is None else now.astimezone(tz)
+    return (now.date() - dt.astimezone(tz).date()).days
 
-def datetime_from_days_ago(days_ago: int) -> datetime:
+
+def datetime_from_days_ago(days_ago: int, now: datetime = None) -> datetime:
     """Return the timestamp at 00:00 days_ago days ago."""
-    return datetime_days_ago(days_ago, datetime.min.time())
+    return datetime_days_ago(days_ago, datetime.min.time(), now)
 
 
-def datetime_to_days_ago(days_ago: int) -> datetime:
+def datetime_to_days_ago(days_ago: int, now: datetime = None) -> datetime:
     """Return the timestamp at 23:59 days_ago days ago."""
-    return datetime_days_ago(days_ago, datetime.max.time())
+    return datetime_days_ago(days_ago, datetime.max.time(), now)
+
+
+# The Flux queries for the most recent point of a tariff's price type and of a
+# usage, filled in with str.format_map(); _LAST_TSTAMP_TAIL is appended to them
+# by query_last_datetime().
+_TARIFF_LAST_Q = '''
+        from(bucket: "{bucket}")
+        |> range(start: -{days}d)
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+        |> filter(fn: (r) => r["energy_type"] == "{energy_type}")
+        |> filter(fn: (r) => r["price_type"] == "{price_type}")
+        |> filter(fn: (r) => r["tariff_code"] == "{tariff_code}")
+    '''
+_CONSUMPTION_LAST_Q = '''
+        from(bucket: "{bucket}")
+        |> range(start: -{days}d)
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+        |> filter(fn: (r) => r["direction"] == "{direction}")
+        |> filter(fn: (r) => r["meter_point"] == "{meter_point}")
+        |> filter(fn: (r) => r["meter_serial"] == "{meter_serial}")
+    '''
+_LAST_TSTAMP_TAIL = '''
+        |> keep(columns: ["_time"])
+        |> sort(columns: ["_time"], desc: false)
+        |> last(column: "_time")
+        |> yield(name: "last_tstamp")
+    '''
 
 
 def query_last_datetime(query_api: query_api,
@@ -294,13 +548,7 @@ def query_last_datetime(query_api: query_api,
     The function will look for data at most from_max_days_ago old. If none is found,
     it will return the timestamp from from_max_days_ago.
     """
-    query = base_query + '''
-        |> keep(columns: ["_time"])
-        |> sort(columns: ["_time"], desc: false)
-        |> last(column: "_time")
-        |> yield(name: "last_tstamp")
-    '''
-    tables = query_api.query(query)
+    tables = query_api.query(base_query + _LAST_TSTAMP_TAIL)
     results = tables.to_values(columns=['_time'])
     if results:
         return results[-1][0]
@@ -318,14 +566,9 @@ def tariff_last_datetime(query_api: query_api,
     The function will look for data at most from_max_days_ago old. If none is found,
     it will return the timestamp from from_max_days_ago.
     """
-    base_query = f'''
-        from(bucket: "{influx_bucket}")
-        |> range(start: -{from_max_days_ago}d)
-        |> filter(fn: (r) => r["_measurement"] == "{influx_measurement}")
-        |> filter(fn: (r) => r["energy_type"] == "{energy_type}")
-        |> filter(fn: (r) => r["price_type"] == "{price_type}")
-        |> filter(fn: (r) => r["tariff_code"] == "{tariff_code}")
-    '''
+    base_query = _TARIFF_LAST_Q.format_map(dict(
+        bucket=influx_bucket, days=from_max_days_ago, measurement=influx_measurement,
+        energy_type=energy_type, price_type=price_type, tariff_code=tariff_code))
     return query_last_datetime(query_api, base_query, from_max_days_ago)
 
 
@@ -339,18 +582,168 @@ def consumption_last_iso8601(query_api: query_api,
     The function will look for data at most from_max_days_ago old. If none is found,
     it will return the timestamp from from_max_days_ago.
     """
-    base_query = f'''
-        from(bucket: "{influx_bucket}")
-        |> range(start: -{from_max_days_ago}d)
-        |> filter(fn: (r) => r["_measurement"] == "{influx_measurement}")
-        |> filter(fn: (r) => r["direction"] == "{direction}")
-        |> filter(fn: (r) => r["meter_point"] == "{meter_point}")
-        |> filter(fn: (r) => r["meter_serial"] == "{meter_serial}")
-    '''
+    base_query = _CONSUMPTION_LAST_Q.format_map(dict(
+        bucket=influx_bucket, days=from_max_days_ago, measurement=influx_measurement,
+        direction=direction, meter_point=meter_point, meter_serial=meter_serial))
     last_dt = query_last_datetime(query_api, base_query, from_max_days_ago)
     return iso8601_from_datetime(last_dt)
 
 
+class BatchingCallback:
+    """Keep track of the batches written to InfluxDB by a batching write API.
+
+    The batches are written from a background thread, so a failed write cannot
+    raise in the caller: the outcome of each batch is recorded instead, and
+    check() raises once the write API has been closed (i.e. flushed).
+    """
+
+    def __init__(self):
+        self.points_written = 0
+        self.errors = []
+        # The series (measurement and tags) with points in the failed batches:
+        self.failed_series = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _points_in(data: bytes) -> int:
+        # A batch is the line protocol of its points joined by newlines:
+        return data.count(b'\n') + 1
+
+    @staticmethod
+    def _series_in(data: bytes) -> set[str]:
+        return {series_of_point(line) for line in data.decode().split('\n')}
+
+    def success(self, conf: tuple[str, str, str], data: bytes):
+        points = self._points_in(data)
+        with self._lock:
+            self.points_written += points
+        logging.debug(f'Batch of {points} points written to Influx.')
+
+    def error(self, conf: tuple[str, str, str], data: bytes, exception: Exception):
+        series = self._series_in(data)
+        with self._lock:
+            self.errors.append(exception)
+            self.failed_series |= series
+        # The batches mix the points of the series written concurrently:
+        logging.error(f'Failed to write a batch of {self._points_in(data)} points to Influx, '
+                      f'of the series {", ".join(sorted(series))}: {exception}')
+
+    def retry(self, conf: tuple[str, str, str], data: bytes, exception: Exception):
+        logging.warning(f'Retrying to write a batch of {self._points_in(data)} points to Influx: {exception}')
+
+    def has_failed(self, point: str) -> bool:
+        """Whether a batch with points of the series of point (in line protocol) failed to be written."""
+        with self._lock:
+            return series_of_point(point) in self.failed_series
+
+    def check(self, points_expected: int, from_days_ago: int = None):
+        """Raise a RuntimeError if not all the expected points were written.
+
+        The batches are written asynchronously, so some points may have been
+        written after a failed batch, leaving a gap which the next runs would
+        not fill: from_days_ago is the value to rerun with to fill it.
+        """
+        rerun = (f': rerun with --from_days_ago {from_days_ago} to fill any gap'
+                 if from_days_ago is not None else '')
+        if self.errors:
+            raise RuntimeError(
+                f'{len(self.errors)} batches failed to be written to Influx, of the series '
+                f'{", ".join(sorted(self.failed_series))}{rerun}') from self.errors[0]
+        if self.points_written != points_expected:
+            raise RuntimeError(
+                f'Only {self.points_written} out of {points_expected} points were written to Influx{rerun}')
+
+
+class WriteStoppedError(RuntimeError):
+    """Raised when no more points of a series are queued, as a batch with some of them failed to be written."""
+
+
+def write_points(write_api: write_api.WriteApi, bucket: str, points: Iterable[str],
+                 batch_size: int = 5_000, callback: BatchingCallback = None) -> int:
+    """Write points (in line protocol) to InfluxDB as they come, batch_size at a time.
+
+    Return the number of points written. If given, the callback of the write_api
+    is checked before each batch, and WriteStoppedError raised once a batch with
+    points of the same series failed to be written, so no more (newer) points of
+    the series are queued after it. The points are expected to be of a single series.
+    """
+    count = 0
+    batch = []
+    for point in points:
+        batch.append(point)
+        if len(batch) >= batch_size:
+            count += _write_batch(write_api, bucket, batch, callback)
+            batch = []
+    if batch:
+        count += _write_batch(write_api, bucket, batch, callback)
+    return count
+
+
+# The batching write_api queues the points in an (rx) subject which is not
+# thread-safe, and points may be lost if written concurrently: the writes from
+# the executor's threads are serialised (they only queue the points, so this is quick).
+_WRITE_LOCK = threading.Lock()
+
+
+def _write_batch(write_api: write_api.WriteApi, bucket: str, batch: list[str],
+                 callback: BatchingCallback = None) -> int:
+    if callback is not None and callback.has_failed(batch[0]):
+        raise WriteStoppedError(f'Stopped writing the series {series_of_point(batch[0])} to Influx, '
+                                'as a batch with some of its points failed to be written')
+    if logging.root.isEnabledFor(logging.DEBUG):
+        logging.debug("\n" + "\n".join(batch))
+    with _WRITE_LOCK:
+        write_api.write(bucket=bucket, record=batch, write_precision=WritePrecision.NS)
+    return len(batch)
+
+
+def process_usage(write_api: write_api.WriteApi, callback: BatchingCallback,
+                  influx_bucket: str, measurement: str,
+                  usage: confuse.templates.AttrDict, octopus_api_key: str, url: str,
+                  from_iso8601: str, to_iso8601: str) -> int:
+    """Retrieve a usage from Octopus and write it to InfluxDB as it comes.
+
+    Return the number of points written.
+    """
+    # we ask Octopus for the data from oldest to newest, rather than the
+    # default newest to oldest, and stop queueing points once a batch failed:
+    # (this limits how many points get written after a failed batch, but as
+    # the batches are written asynchronously, some may still be: the run then
+    # fails, asking to rerun over its period to fill the gap)
+    data = iter_paginated_data(octopus_api_key, url, from_iso8601, to_iso8601,
+                               order_by='period', page_size=CONSUMPTION_PAGE_SIZE)
+    prefix = line_protocol_prefix(measurement, usage_tags(usage))
+    points = (consumption_to_point(measurement, row, usage, prefix) for row in data)
+    written = write_points(write_api, influx_bucket, points, callback=callback)
+    logging.info(f'====== {usage.energy_type} {usage.direction} ({usage.meter_point}): '
+                 f'{written} points retrieved from Octopus and queued for writing to Influx.')
+    return written
+
+
+def process_tariff(write_api: write_api.WriteApi, callback: BatchingCallback,
+                   influx_bucket: str, measurement: str,
+                   tariff: confuse.templates.AttrDict, price_type: str, unit: str,
+                   octopus_api_key: str, url: str, from_dt: datetime, to_dt: datetime) -> int:
+    """Retrieve a price type of a tariff from Octopus and write it to InfluxDB.
+
+    Return the number of points written.
+    """
+    # we receive the prices from Octopus from newest to oldest - we reverse this,
+    # and stop queueing points once a batch failed (see process_usage()):
+    data = retrieve_paginated_data(octopus_api_key, url, iso8601_from_datetime(from_dt), iso8601_from_datetime(to_dt),
+                                   reverse=True, page_size=TARIFF_PAGE_SIZE)
+    if logging.root.isEnabledFor(logging.DEBUG):
+        logging.debug("\n" + "\n".join([str(point) for point in data]))
+    prefix = line_protocol_prefix(measurement, tariff_tags(tariff, price_type))
+    points = (point for r in data for point in std_unit_rate_to_points(
+        measurement, r, price_type, unit, tariff, from_dt, to_dt, prefix))
+    written = write_points(write_api, influx_bucket, points, callback=callback)
+    logging.info(f'====== {tariff.energy_type} {price_type} price of tariff {tariff.full_name}: '
+                 f'{len(data)} points retrieved from Octopus, {written} points queued for writing to Influx '
+                 '(including any extra points for easier querying and better charting).')
+    return written
+
+
 def build_argparser(params: dict[str, Parameter]) -> argparse.ArgumentParser:
     """Build and return a command line argument parser."""
     parser = argparse.ArgumentParser(
@@ -394,11 +787,17 @@ if __name__ == "__main__":
     cfg.set_args(args)
 
     cfg.set_env()
+    local_timezone.cache_clear()
 
     logging.root.setLevel(cfg['loglevel'])
     if read_local_config:
         logging.info(f'Read configuration from {local_config_path}.')
 
+    if cfg['octopus_cache']:
+        CACHE = diskcache.Cache(path.join(path.expanduser('~'), '.cache', PROGNAME))
+    # Keep a pooled connection for each of the concurrent queries:
+    SESSION = build_session(pool_maxsize=cfg['octopus_concurrency'])
+
     to_dt = datetime_to_days_ago(cfg['to_days_ago'])
     to_iso8601 = iso8601_from_datetime(to_dt)
     try:
@@ -410,83 +809,82 @@ if __name__ == "__main__":
     except confuse.exceptions.NotFoundError:
         from_days_ago = None
 
-    client = InfluxDBClient(url=cfg['influx_url'],
-                            token=cfg['influx_api_token'], org=cfg['influx_org'],
-                            retries=Retry(connect=5, read=4, backoff_factor=0.7))
-    write_api = client.write_api(write_options=SYNCHRONOUS)
-    query_api = client.query_api()
-
-    # Get consumption
-    logging.info('=== Retrieving consumption...')
-    for usage in cfg['usage']:
-        consumption_url = get_url_of_consumption(cfg['base_url'], usage)
-        logging.debug(f'API URL: {consumption_url}')
-
-        if from_days_ago is None:
-            from_iso8601 = consumption_last_iso8601(
-                query_api, cfg['influx_bucket'], cfg['from_max_days_ago'],
-                cfg['influx_usage_measurement'], usage.energy_type, usage.direction,
-                usage.meter_point, usage.meter_serial)
-
-        logging.info(f'====== Retrieving {usage.energy_type} {usage.direction} ({usage.meter_point}) from Octopus...')
-        logging.debug(f"from {from_iso8601} to {to_iso8601}")
-        data = retrieve_paginated_data(
-            cfg['octopus_api_key'], consumption_url, from_iso8601, to_iso8601)
-
-        logging.info(
-            f'       ... {len(data)} points retrieved from Octopus.')
-
-        logging.info(f'====== Writing {usage.energy_type} {usage.direction} ({usage.meter_point}) to Influx...')
-        points = []
-        # we receive the data from Octopus from newest to oldest - we reverse this:
-        # (in particular this ensures we won't have a gap if we fail in the middle
-        # of writing and then start again from the newest written point)
-        for row in reversed(data):
-            points.append(consumption_to_point(
-                cfg['influx_usage_measurement'], row, usage))
-
-        if cfg['loglevel'] == 'DEBUG':
-            logging.debug("\n" + "\n".join([p.to_line_protocol() for p in points]))
-
-        write_api.write(bucket=cfg['influx_bucket'], record=points)
-        logging.info(
-            f'       ... {len(points)} points written to Influx.')
+    # Each access to cfg is validated, so we only read the settings once:
+    base_url = cfg['base_url']
+    octopus_api_key = cfg['octopus_api_key']
+    price_types = cfg['price_types']
+    influx_bucket = cfg['influx_bucket']
+    usage_measurement = cfg['influx_usage_measurement']
+    tariff_measurement = cfg['influx_tariff_measurement']
+    from_max_days_ago = cfg['from_max_days_ago']
+
+    batching_callback = BatchingCallback()
+    points_count = 0
+    write_options = WriteOptions(batch_size=5_000, flush_interval=10_000,
+                                 jitter_interval=2_000, retry_interval=5_000,
+                                 max_retries=5, max_retry_delay=30_000,
+                                 exponential_base=2)
+    # The writes to Influx are batched, and retried on errors, in the background,
+    # and closing the write_api waits for all of them to be flushed, even on errors.
+    # A batch failing (once its retries are exhausted) does not stop the batches
+    # queued after it from being written: the run then fails, asking to rerun
+    # from the oldest point retrieved, to fill any gap.
+    # Each usage and tariff is retrieved from Octopus and written to Influx by
+    # the executor's threads concurrently, sharing the write_api.
+    with InfluxDBClient(url=cfg['influx_url'],
+                        token=cfg['influx_api_token'], org=cfg['influx_org'],
+                        retries=Retry(connect=5, read=4, backoff_factor=0.7)) as client, \
+            client.write_api(write_options=write_options,
+                             success_callback=batching_callback.success,
+                             error_callback=batching_callback.error,
+                             retry_callback=batching_callback.retry) as write_api, \
+            ThreadPoolExecutor(max_workers=cfg['octopus_concurrency']) as executor:
+        query_api = client.query_api()
+
+        # The last written points are all queried before submitting any job, so
+        # they are not affected by the points written by the jobs:
+        jobs = []
+        oldest_dt = to_dt
+        for usage in cfg['usage']:
+            consumption_url = get_url_of_consumption(base_url, usage)
+            logging.debug(f'API URL: {consumption_url}')
 
+            if from_days_ago is None:
+                from_iso8601 = consumption_last_iso8601(
+                    query_api, influx_bucket, from_max_days_ago,
+                    usage_measurement, usage.energy_type, usage.direction,
+                    usage.meter_point, usage.meter_serial)
+
+            logging.debug(f"{usage.energy_type} {usage.direction} ({usage.meter_point}) from {from_iso8601} to {to_iso8601}")
+            oldest_dt = min(oldest_dt, datetime_from_iso8601(from_iso8601))
+            jobs.append((process_usage, write_api, batching_callback, influx_bucket, usage_measurement, usage,
+                         octopus_api_key, consumption_url, from_iso8601, to_iso8601))
+
+        for tariff in cfg['tariffs']:
+            for price_type, unit in price_types.items():
+                url = get_url_of_tariff(base_url, tariff, price_type)
+
+                if from_days_ago is None:
+                    from_dt = tariff_last_datetime(
+                        query_api, influx_bucket, from_max_days_ago,
+                        tariff_measurement, tariff.energy_type, price_type, tariff.tariff_code)
+
+                logging.debug(f"{tariff.energy_type} {price_type} of tariff {tariff.full_name} from {from_dt} to {to_dt}")
+                oldest_dt = min(oldest_dt, from_dt)
+                jobs.append((process_tariff, write_api, batching_callback, influx_bucket, tariff_measurement, tariff, price_type, unit,
+                             octopus_api_key, url, from_dt, to_dt))
+
+        logging.info('=== Retrieving consumption and tariffs from Octopus, and writing them to Influx...')
+        futures = [executor.submit(*job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                points_count += future.result()
+            except WriteStoppedError as e:
+                logging.error(e)
+        if logging.root.isEnabledFor(logging.INFO):
+            print(flush=True)  # end the line of progress dots
 
-    logging.info('=== Retrieving tariffs...')
-    for tariff in cfg['tariffs']:
-        for price_type, unit in cfg['price_types'].items():
-            url = get_url_of_tariff(cfg['base_url'], tariff, price_type)
+        logging.info('=== Flushing the writes to Influx...')
 
-            if from_days_ago is None:
-                from_dt = tariff_last_datetime(
-                    query_api, cfg['influx_bucket'], cfg['from_max_days_ago'],
-                    cfg['influx_tariff_measurement'], tariff.energy_type, price_type, tariff.tariff_code)
-                from_iso8601 = iso8601_from_datetime(from_dt)
-
-            logging.info(f'====== Retrieving {tariff.energy_type} {price_type} price of tariff {tariff.full_name} from Octopus...')
-            logging.debug(f"from {from_iso8601} to {to_iso8601}")
-            data = retrieve_paginated_data(
-                cfg['octopus_api_key'], url, from_iso8601, to_iso8601)
-            if cfg['loglevel'] == 'DEBUG':
-                logging.debug("\n" + "\n".join([str(point) for point in data]))
-            logging.info(
-                f'       ... {len(data)} points retrieved from Octopus.')
-
-            logging.info(f'====== Writing {tariff.energy_type} {price_type} price of tariff {tariff.full_name} to Influx...')
-            logging.debug(f"from {from_dt} to {to_dt}")
-            points = []
-            # we receive the data from Octopus from newest to oldest - we reverse this:
-            # (in particular this ensures we won't have a gap if we fail in the middle
-            # of writing and then start again from the newest written point)
-            for r in reversed(data):
-                points.extend(std_unit_rate_to_points(
-                    cfg['influx_tariff_measurement'], r, price_type, unit, tariff, from_dt, to_dt))
-
-            if cfg['loglevel'] == 'DEBUG':
-                logging.debug("\n" + "\n".join([p.to_line_protocol() for p in points]))
-
-            write_api.write(bucket=cfg['influx_bucket'], record=points)
-            logging.info(
-                f'       ... {len(points)} points written to Influx '
-                '(including any extra points for easier querying and better charting).')
+    batching_callback.check(points_count, days_ago_from_datetime(oldest_dt))
+    logging.info(f'       ... {points_count} points written to Influx.')
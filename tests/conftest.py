@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Make the octo2influx script importable by the tests, wherever pytest is run from:
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
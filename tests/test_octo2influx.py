@@ -1,27 +1,74 @@
-import sys
+import json
 import os
 
-sys.path.append(os.path.abspath('./src'))  # to run from top dir
-sys.path.append(os.path.abspath('../src'))  # to run from tests/ dir
-
 import pytest
 
 from datetime import datetime, timedelta, timezone
-from freezegun import freeze_time
-import pytz
+from zoneinfo import ZoneInfo
 import octo2influx
+import confuse
+import diskcache
+import yaml
+from influxdb_client import Point
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without LibYAML
+    from yaml import SafeLoader
 from octo2influx import cfg
 
-@pytest.fixture
-def load_example_config():
+LONDON_TZ = ZoneInfo('Europe/London')
+
+# The datetime tests are run at various times of the same day:
+NOW_DATES = [datetime(2024, 1, 10, 12, 34, 56, tzinfo=timezone.utc),
+             datetime(2024, 1, 10, 0, 0, 0, tzinfo=timezone.utc),
+             datetime(2024, 1, 10, 23, 59, 59, tzinfo=timezone.utc)]
+
+EXAMPLE_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src', 'config.example.yaml')
+if not os.path.isfile(EXAMPLE_CONFIG_PATH):
+    raise FileNotFoundError(f"Could not find '{EXAMPLE_CONFIG_PATH}'")
+
+@pytest.fixture(scope='session')
+def example_config_source(pytestconfig):
+    """Parse the example config once for the whole test session.
+
+    The example config is plain YAML, so it is parsed with LibYAML's (much
+    faster) loader when available, rather than confuse's pure-Python one.
+    The parsed config is also kept as JSON in pytest's cache, and only parsed
+    again from the YAML file when the latter is modified.
+    """
+    # pytest's cache is not available if disabled with -p no:cacheprovider:
+    cache = getattr(pytestconfig, 'cache', None)
+    mtime = os.path.getmtime(EXAMPLE_CONFIG_PATH)
+    cached = cache.get('octo2influx/config.example', None) if cache else None
+    if cached and cached['mtime'] == mtime:
+        data = cached['config']
+    else:
+        with open(EXAMPLE_CONFIG_PATH) as f:
+            data = yaml.load(f, Loader=SafeLoader) or {}
+        if cache:
+            cache.set('octo2influx/config.example', {'mtime': mtime, 'config': data})
+    return confuse.ConfigSource(data, filename=EXAMPLE_CONFIG_PATH)
+
+def set_example_config(source):
     cfg.clear()
-    for directory in '../src', 'src':
-        path = os.path.join(directory, 'config.example.yaml')
-        if os.path.isfile(path):
-            cfg.set_file(path)
-            return
+    cfg.set(source)
+    octo2influx.local_timezone.cache_clear()
 
-    raise FileNotFoundError("Could not find 'config.example.yaml'")
+@pytest.fixture
+def load_example_config(example_config_source):
+    set_example_config(example_config_source)
+
+@pytest.fixture(scope='session')
+def flux_tariff(example_config_source):
+    """The Octopus Flux Import tariff of the example config, resolved once."""
+    set_example_config(example_config_source)
+    return cfg['tariffs'][3]
+
+@pytest.fixture(scope='session')
+def example_usages(example_config_source):
+    """The usages of the example config, resolved once."""
+    set_example_config(example_config_source)
+    return cfg['usage']
 
 def test_load_config(load_example_config):
     # This also tests the validation of each of these valid config items:
@@ -29,99 +76,271 @@ def test_load_config(load_example_config):
     assert cfg['from_max_days_ago'] == 60
     assert cfg['loglevel'] == 'INFO'
 
-def test_datetime_days_ago(load_example_config):
-    cfg_tz = pytz.timezone(cfg['timezone'])
-    for d in ['2024-01-10 12:34:56', '2024-01-10 00:00:00', '2024-01-10 23:59:59']:
-        with freeze_time(d):
-            assert octo2influx.datetime_days_ago(0, datetime.min.time()) == cfg_tz.localize(datetime(2024, 1, 10, 0, 0, 0))
-            assert octo2influx.datetime_days_ago(0, datetime.max.time()) == cfg_tz.localize(datetime(2024, 1, 10, 23, 59, 59, 999999))
-
-            assert octo2influx.datetime_days_ago(1, datetime.min.time()) == cfg_tz.localize(datetime(2024, 1, 9, 0, 0, 0))
-            assert octo2influx.datetime_days_ago(5, datetime.min.time()) == cfg_tz.localize(datetime(2024, 1, 5, 0, 0, 0))
-
-def test_datetime_from_days_ago(load_example_config):
-    cfg_tz = pytz.timezone(cfg['timezone'])
-    for d in ['2024-01-10 12:34:56', '2024-01-10 00:00:00', '2024-01-10 23:59:59']:
-        with freeze_time(d):
-            assert octo2influx.datetime_from_days_ago(0) == cfg_tz.localize(datetime(2024, 1, 10, 0, 0, 0))
-            assert octo2influx.datetime_from_days_ago(1) == cfg_tz.localize(datetime(2024, 1, 9, 0, 0, 0))
-            assert octo2influx.datetime_from_days_ago(5) == cfg_tz.localize(datetime(2024, 1, 5, 0, 0, 0))
-
-def test_datetime_to_days_ago(load_example_config):
-    cfg_tz = pytz.timezone(cfg['timezone'])
-    for d in ['2024-01-10 12:34:56', '2024-01-10 00:00:00', '2024-01-10 23:59:59']:
-        with freeze_time(d):
-            assert octo2influx.datetime_to_days_ago(0) == cfg_tz.localize(datetime(2024, 1, 10, 23, 59, 59, 999999))
-            assert octo2influx.datetime_to_days_ago(1) == cfg_tz.localize(datetime(2024, 1, 9, 23, 59, 59, 999999))
-            assert octo2influx.datetime_to_days_ago(5) == cfg_tz.localize(datetime(2024, 1, 5, 23, 59, 59, 999999))
+@pytest.mark.parametrize('now', NOW_DATES)
+def test_datetime_days_ago(load_example_config, now):
+    cfg_tz = ZoneInfo(cfg['timezone'])
+    assert octo2influx.datetime_days_ago(0, datetime.min.time(), now=now) == datetime(2024, 1, 10, 0, 0, 0, tzinfo=cfg_tz)
+    assert octo2influx.datetime_days_ago(0, datetime.max.time(), now=now) == datetime(2024, 1, 10, 23, 59, 59, 999999, tzinfo=cfg_tz)
+
+    assert octo2influx.datetime_days_ago(1, datetime.min.time(), now=now) == datetime(2024, 1, 9, 0, 0, 0, tzinfo=cfg_tz)
+    assert octo2influx.datetime_days_ago(5, datetime.min.time(), now=now) == datetime(2024, 1, 5, 0, 0, 0, tzinfo=cfg_tz)
+
+@pytest.mark.parametrize('now', NOW_DATES)
+def test_datetime_from_days_ago(load_example_config, now):
+    cfg_tz = ZoneInfo(cfg['timezone'])
+    assert octo2influx.datetime_from_days_ago(0, now=now) == datetime(2024, 1, 10, 0, 0, 0, tzinfo=cfg_tz)
+    assert octo2influx.datetime_from_days_ago(1, now=now) == datetime(2024, 1, 9, 0, 0, 0, tzinfo=cfg_tz)
+    assert octo2influx.datetime_from_days_ago(5, now=now) == datetime(2024, 1, 5, 0, 0, 0, tzinfo=cfg_tz)
+
+@pytest.mark.parametrize('now', NOW_DATES)
+def test_datetime_to_days_ago(load_example_config, now):
+    cfg_tz = ZoneInfo(cfg['timezone'])
+    assert octo2influx.datetime_to_days_ago(0, now=now) == datetime(2024, 1, 10, 23, 59, 59, 999999, tzinfo=cfg_tz)
+    assert octo2influx.datetime_to_days_ago(1, now=now) == datetime(2024, 1, 9, 23, 59, 59, 999999, tzinfo=cfg_tz)
+    assert octo2influx.datetime_to_days_ago(5, now=now) == datetime(2024, 1, 5, 23, 59, 59, 999999, tzinfo=cfg_tz)
 
 
+def test_days_ago_from_datetime(load_example_config):
+    now = datetime(2024, 1, 10, 12, 34, 56, tzinfo=timezone.utc)
+    assert octo2influx.days_ago_from_datetime(datetime(2024, 1, 10, 0, 0, 0, tzinfo=LONDON_TZ), now=now) == 0
+    assert octo2influx.days_ago_from_datetime(datetime(2024, 1, 5, 23, 59, 59, tzinfo=LONDON_TZ), now=now) == 5
+    assert octo2influx.days_ago_from_datetime(octo2influx.datetime_from_days_ago(60, now=now), now=now) == 60
+
 def test_iso8601_from_datetime():
-    london = pytz.timezone('Europe/London')
     # Summer time (BST):
-    assert octo2influx.iso8601_from_datetime(london.localize(datetime(2023, 6, 2, 15, 0, 0))) == '2023-06-02T14:00:00Z'
-    assert octo2influx.iso8601_from_datetime(london.localize(datetime(2023, 6, 2, 00, 30, 0))) == '2023-06-01T23:30:00Z'
+    assert octo2influx.iso8601_from_datetime(datetime(2023, 6, 2, 15, 0, 0, tzinfo=LONDON_TZ)) == '2023-06-02T14:00:00Z'
+    assert octo2influx.iso8601_from_datetime(datetime(2023, 6, 2, 00, 30, 0, tzinfo=LONDON_TZ)) == '2023-06-01T23:30:00Z'
 
     # Winter time (GMT):
-    assert octo2influx.iso8601_from_datetime(london.localize(datetime(2024, 1, 10, 15, 0, 0))) == '2024-01-10T15:00:00Z'
-    assert octo2influx.iso8601_from_datetime(london.localize(datetime(2024, 1, 10, 00, 30, 0))) == '2024-01-10T00:30:00Z'
+    assert octo2influx.iso8601_from_datetime(datetime(2024, 1, 10, 15, 0, 0, tzinfo=LONDON_TZ)) == '2024-01-10T15:00:00Z'
+    assert octo2influx.iso8601_from_datetime(datetime(2024, 1, 10, 00, 30, 0, tzinfo=LONDON_TZ)) == '2024-01-10T00:30:00Z'
+
+    # Already in UTC:
+    assert octo2influx.iso8601_from_datetime(datetime(2024, 1, 10, 00, 30, 0, 123456, tzinfo=timezone.utc)) == '2024-01-10T00:30:00Z'
+
+
+def test_datetime_from_iso8601():
+    assert octo2influx.datetime_from_iso8601('2023-06-02T18:00:00Z') == datetime(2023, 6, 2, 18, 0, 0, tzinfo=timezone.utc)
+    assert octo2influx.datetime_from_iso8601('2023-07-31T00:30:00+01:00') == datetime(2023, 7, 30, 23, 30, 0, tzinfo=timezone.utc)
 
+@pytest.fixture(scope='module')
+def flux_window():
+    """Return the (from_dt, to_dt) window of the std_unit_rate_to_points() tests."""
+    return datetime(2023, 12, 17, 0, 0, tzinfo=LONDON_TZ), datetime(2023, 12, 22, 23, 59, 59, tzinfo=LONDON_TZ)
 
-def     test_std_unit_rate_to_points_long_point_validity(load_example_config):
+def test_std_unit_rate_to_points_long_point_validity(flux_tariff, flux_window):
     row = {'value_exc_vat': 34.7988, 'value_inc_vat': 36.53874, 'valid_from': '2023-03-31T23:00:00Z', 'valid_to': '2024-01-01T00:00:00Z', 'payment_method': None}
-    london = pytz.timezone('Europe/London')
-    from_dt = london.localize(datetime(2023, 12, 17, 00, 00))
-    to_dt = london.localize(datetime(2023, 12, 22, 23, 59, 59))
-    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, 'standing-charges', 'p/day', cfg['tariffs'][3], from_dt, to_dt)
-    expected_str_points = [
-        # one point per day from from_dt (2023-12-17) to valid_to (2024-01-01T00:00):
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1702771200000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1702857600000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1702944000000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703030400000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703116800000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703203200000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703289600000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703376000000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703462400000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703548800000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703635200000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703721600000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703808000000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703894400000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1703980800000000000',
-        'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 1704067199000000000'
-    ]
-    assert [p.to_line_protocol() for p in points] == expected_str_points
+    from_dt, to_dt = flux_window
+    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, 'standing-charges', 'p/day', flux_tariff, from_dt, to_dt)
+    base = 'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standing-charges,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/day_exc_vat=34.7988,p/day_inc_vat=36.53874 '
+    # one point per day from from_dt (2023-12-17) to valid_to (2024-01-01T00:00):
+    timestamps = [1702771200 + i * 86400 for i in range(15)] + [1704067199]
+    expected_str_points = [f"{base}{ts}000000000" for ts in timestamps]
+    # compared as single strings, for a compact line by line diff on failure:
+    assert '\n'.join(points) == '\n'.join(expected_str_points)
 
 
-def test_std_unit_rate_to_points_short_point_validity(load_example_config):
+def test_std_unit_rate_to_points_short_point_validity(flux_tariff, flux_window):
     row = {'value_exc_vat': 37.9043, 'value_inc_vat': 39.799515, 'valid_from': '2023-12-19T16:00:00Z', 'valid_to': '2023-12-19T19:00:00Z', 'payment_method': None}
-    london = pytz.timezone('Europe/London')
-    from_dt = london.localize(datetime(2023, 12, 17, 00, 00))
-    to_dt = london.localize(datetime(2023, 12, 22, 23, 59, 59))
-    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, "standard-unit-rates", "p/kWh", cfg['tariffs'][3], from_dt, to_dt)
+    from_dt, to_dt = flux_window
+    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, "standard-unit-rates", "p/kWh", flux_tariff, from_dt, to_dt)
     expected_str_points = [
         'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standard-unit-rates,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/kWh_exc_vat=37.9043,p/kWh_inc_vat=39.799515 1703001600000000000',
         'octopus-tariffs,direction=import,display_name=Octopus\\ Flux\\ Import,energy_type=electricity,price_type=standard-unit-rates,product_code=FLUX-IMPORT-23-02-14,tariff_code=E-1R-FLUX-IMPORT-23-02-14-C p/kWh_exc_vat=37.9043,p/kWh_inc_vat=39.799515 1703012399000000000'
     ]
-    assert [p.to_line_protocol() for p in points] == expected_str_points
-
-
-def test_consumption_to_point(load_example_config):
-    row = {'consumption': 1.214, 'interval_start': '2023-12-19T04:30:00Z', 'interval_end': '2023-12-19T05:00:00Z'}
-    point = octo2influx.consumption_to_point('octopus-usage', row, cfg['usage'][0])
-    expected_point_str = 'octopus-usage,direction=import,energy_type=electricity,meter_point=mpan,meter_serial=serial_number interval_end=1702962000,interval_start=1702960200,kWh=1.214 1702961100000000000'
-    assert point.to_line_protocol() == expected_point_str
-
-def test_consumption_to_point_electricty_summer(load_example_config):
-    row = {'consumption': 0.001, 'interval_start': '2023-08-30T00:00:00+01:00', 'interval_end': '2023-08-30T00:30:00+01:00'}
-    point = octo2influx.consumption_to_point('octopus-usage', row, cfg['usage'][0])
-    expected_point_str = 'octopus-usage,direction=import,energy_type=electricity,meter_point=mpan,meter_serial=serial_number interval_end=1693351800,interval_start=1693350000,kWh=0.001 1693350900000000000'
-    assert point.to_line_protocol() == expected_point_str
-
-def test_consumption_to_point_gas(load_example_config):
-    row = {'consumption': 0.0, 'interval_start': '2023-12-14T23:30:00Z', 'interval_end': '2023-12-15T00:00:00Z'}
-    point = octo2influx.consumption_to_point('octopus-usage', row, cfg['usage'][2])
-    expected_point_str = 'octopus-usage,direction=import,energy_type=gas,meter_point=mprn,meter_serial=serial_number interval_end=1702598400,interval_start=1702596600,m3=0 1702597500000000000'
-    assert point.to_line_protocol() == expected_point_str
+    assert points == expected_str_points
+
+
+def test_std_unit_rate_to_points_multiple_days_validity(flux_tariff, flux_window):
+    row = {'value_exc_vat': 37.9043, 'value_inc_vat': 39.799515, 'valid_from': '2023-12-18T12:00:00Z', 'valid_to': '2023-12-21T12:00:00Z', 'payment_method': None}
+    from_dt, to_dt = flux_window
+    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, "standard-unit-rates", "p/kWh", flux_tariff, from_dt, to_dt)
+    # one point at valid_from, then at the start of each day, then at valid_to-1s:
+    assert [p.split(' ')[-1] for p in points] == [
+        '1702900800000000000', '1702944000000000000', '1703030400000000000', '1703116800000000000', '1703159999000000000']
+
+
+def test_std_unit_rate_to_points_expired_before_from_dt(flux_tariff, flux_window):
+    row = {'value_exc_vat': 37.9043, 'value_inc_vat': 39.799515, 'valid_from': '2023-12-10T12:00:00Z', 'valid_to': '2023-12-16T12:00:00Z', 'payment_method': None}
+    from_dt, to_dt = flux_window
+    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, "standard-unit-rates", "p/kWh", flux_tariff, from_dt, to_dt)
+    assert points == []
+
+@pytest.mark.parametrize('row, usage_idx, expected_point_str', [
+    pytest.param({'consumption': 1.214, 'interval_start': '2023-12-19T04:30:00Z', 'interval_end': '2023-12-19T05:00:00Z'}, 0,
+                 'octopus-usage,direction=import,energy_type=electricity,meter_point=mpan,meter_serial=serial_number interval_end=1702962000,interval_start=1702960200,kWh=1.214 1702961100000000000',
+                 id='electricity'),
+    pytest.param({'consumption': 0.001, 'interval_start': '2023-08-30T00:00:00+01:00', 'interval_end': '2023-08-30T00:30:00+01:00'}, 0,
+                 'octopus-usage,direction=import,energy_type=electricity,meter_point=mpan,meter_serial=serial_number interval_end=1693351800,interval_start=1693350000,kWh=0.001 1693350900000000000',
+                 id='electricity_summer'),
+    pytest.param({'consumption': 0.0, 'interval_start': '2023-12-14T23:30:00Z', 'interval_end': '2023-12-15T00:00:00Z'}, 2,
+                 'octopus-usage,direction=import,energy_type=gas,meter_point=mprn,meter_serial=serial_number interval_end=1702598400,interval_start=1702596600,m3=0 1702597500000000000',
+                 id='gas'),
+])
+def test_consumption_to_point(example_usages, row, usage_idx, expected_point_str):
+    point = octo2influx.consumption_to_point('octopus-usage', row, example_usages[usage_idx])
+    assert point == expected_point_str
+
+def test_batching_callback():
+    callback = octo2influx.BatchingCallback()
+    conf = ('bucket', 'org', 'ns')
+    callback.success(conf, b'm f=1 1\nm f=2 2')
+    callback.success(conf, b'm f=3 3')
+    callback.check(3)
+    with pytest.raises(RuntimeError):
+        callback.check(4)
+
+    callback.error(conf, b'm,t=a f=4 4\nn f=5 5', Exception('failed'))
+    assert callback.failed_series == {'m,t=a', 'n'}
+    assert callback.has_failed('m,t=a f=6 6')
+    assert not callback.has_failed('m,t=b f=6 6')
+    with pytest.raises(RuntimeError, match='of the series m,t=a, n'):
+        callback.check(3)
+    with pytest.raises(RuntimeError, match='rerun with --from_days_ago 5'):
+        callback.check(3, from_days_ago=5)
+
+def test_series_of_point():
+    assert octo2influx.series_of_point('m,t=a f=1 1') == 'm,t=a'
+    assert octo2influx.series_of_point('my\\ m,t=a\\ b\\,c f=1 1') == 'my\\ m,t=a\\ b\\,c'
+    assert octo2influx.series_of_point('m,t=foo\\ ,u=b f=1 1') == 'm,t=foo\\ ,u=b'
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.content = json.dumps(data).encode()
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_iter_paginated_data(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(octo2influx, 'orjson', None)
+    pages = {
+        None: {'next': 'https://api.octopus.energy/v1/x/?page=2&period_from=f', 'results': [{'n': 1}, {'n': 2}]},
+        '2': {'next': None, 'results': [{'n': 3}]},
+    }
+    requested = []
+    def fake_get(url, params, **kwargs):
+        requested.append(dict(params))
+        return FakeResponse(pages[params.get('page')])
+    monkeypatch.setattr(octo2influx.SESSION, 'get', fake_get)
+
+    rows = octo2influx.iter_paginated_data('key', 'https://api.octopus.energy/v1/x/', 'f', 't', order_by='period')
+    assert list(rows) == [{'n': 1}, {'n': 2}, {'n': 3}]
+    assert requested == [
+        {'period_from': 'f', 'period_to': 't', 'order_by': 'period'},
+        {'period_from': 'f', 'period_to': 't', 'order_by': 'period', 'page': '2'},
+    ]
+
+def test_iter_paginated_data_reverse(monkeypatch):
+    pages = {
+        None: {'next': 'https://api.octopus.energy/v1/x/?page=2', 'results': [{'n': 4}, {'n': 3}]},
+        '2': {'next': None, 'results': [{'n': 2}, {'n': 1}]},
+    }
+    monkeypatch.setattr(octo2influx.SESSION, 'get', lambda url, params, **kwargs: FakeResponse(pages[params.get('page')]))
+
+    rows = octo2influx.iter_paginated_data('key', 'https://api.octopus.energy/v1/x/', 'f', 't', reverse=True)
+    assert list(rows) == [{'n': 1}, {'n': 2}, {'n': 3}, {'n': 4}]
+
+def test_write_points():
+    class FakeWriteApi:
+        def __init__(self):
+            self.writes = []
+
+        def write(self, bucket, record, **kwargs):
+            self.writes.append(list(record))
+
+    fake_write_api = FakeWriteApi()
+    count = octo2influx.write_points(fake_write_api, 'bucket', iter(range(7)), batch_size=3)
+    assert count == 7
+    assert fake_write_api.writes == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_write_points_stops_after_failed_batch():
+    class FakeWriteApi:
+        def __init__(self, callback):
+            self.callback = callback
+            self.writes = []
+
+        def write(self, bucket, record, **kwargs):
+            self.writes.append(list(record))
+            # the first batch fails (in the background, once its retries are exhausted):
+            self.callback.error(('bucket', 'org', 'ns'), '\n'.join(record).encode(), Exception('failed'))
+
+    callback = octo2influx.BatchingCallback()
+    fake_write_api = FakeWriteApi(callback)
+    points = [f'm,t=a f={i} {i}' for i in range(7)]
+    with pytest.raises(octo2influx.WriteStoppedError):
+        octo2influx.write_points(fake_write_api, 'bucket', iter(points), batch_size=3, callback=callback)
+    assert fake_write_api.writes == [points[:3]]
+
+    # the other series are still written:
+    fake_write_api.callback = octo2influx.BatchingCallback()
+    other_points = [f'm,t=b f={i} {i}' for i in range(3)]
+    assert octo2influx.write_points(fake_write_api, 'bucket', iter(other_points), batch_size=3, callback=callback) == 3
+
+def test_period_is_final():
+    assert octo2influx.period_is_final('2024-01-10T00:00:00Z')
+    now = datetime(2024, 1, 11, 12, 0, 0, tzinfo=timezone.utc)
+    assert not octo2influx.period_is_final('2024-01-10T00:00:00Z', now=now)
+    assert octo2influx.period_is_final('2024-01-09T11:59:59Z', now=now)
+
+def test_get_page_cache(monkeypatch, tmp_path):
+    fetched = []
+    def fake_get(url, params, auth, **kwargs):
+        fetched.append((url, dict(params), auth))
+        return FakeResponse({'results': [len(fetched)], 'next': None})
+    monkeypatch.setattr(octo2influx.SESSION, 'get', fake_get)
+    with diskcache.Cache(str(tmp_path)) as cache:
+        monkeypatch.setattr(octo2influx, 'CACHE', cache)
+
+        # a final period is only retrieved once, whatever the API key:
+        final_args = {'period_from': '2024-01-01T00:00:00Z', 'period_to': '2024-01-02T00:00:00Z'}
+        assert octo2influx.get_page('key1', 'https://api/url', final_args) == {'results': [1], 'next': None}
+        assert octo2influx.get_page('key2', 'https://api/url', final_args) == {'results': [1], 'next': None}
+        assert len(fetched) == 1
+        assert all('key1' not in str(key) for key in cache.iterkeys())
+
+        # a recent period is retrieved every time:
+        recent_args = {'period_from': '2024-01-01T00:00:00Z',
+                       'period_to': octo2influx.iso8601_from_datetime(datetime.now(timezone.utc))}
+        octo2influx.get_page('key1', 'https://api/url', recent_args)
+        octo2influx.get_page('key1', 'https://api/url', recent_args)
+        assert len(fetched) == 3
+
+def test_line_protocol_prefix():
+    tags = {'name': 'Octopus Flux, Import', 'a=b': 'c', 'empty': ''}
+    assert octo2influx.line_protocol_prefix('my measurement', tags) == 'my\\ measurement,a\\=b=c,name=Octopus\\ Flux\\,\\ Import'
+
+def test_line_protocol_prefix_trailing_backslash():
+    tags = {'a': 'foo\\', 'b': 'bar'}
+    prefix = octo2influx.line_protocol_prefix('m', tags)
+    assert prefix == 'm,a=foo\\ ,b=bar'
+    # Same as the Influx client:
+    assert prefix == Point('m').tag('a', 'foo\\').tag('b', 'bar').field('f', 1.0).to_line_protocol().split(' f=')[0]
+
+def test_line_protocol_field():
+    assert octo2influx.line_protocol_field('p/kWh_inc_vat', 36.53874) == 'p/kWh_inc_vat=36.53874'
+    assert octo2influx.line_protocol_field('kWh', 0.0) == 'kWh=0'
+    # Whole numbers are still floats, so the field type doesn't change:
+    assert octo2influx.line_protocol_field('p/day inc', 15) == 'p/day\\ inc=15'
+    # Like the Influx client, missing and non-finite values are skipped:
+    assert octo2influx.line_protocol_field('kWh', None) == ''
+    assert octo2influx.line_protocol_field('kWh', float('nan')) == ''
+    assert octo2influx.line_protocol_field('kWh', float('inf')) == ''
+
+def test_std_unit_rate_to_points_missing_values(flux_tariff, flux_window):
+    from_dt, to_dt = flux_window
+    row = {'value_exc_vat': 37.9043, 'value_inc_vat': None, 'valid_from': '2023-12-19T16:00:00Z', 'valid_to': '2023-12-19T19:00:00Z', 'payment_method': None}
+    points = octo2influx.std_unit_rate_to_points('octopus-tariffs', row, "standard-unit-rates", "p/kWh", flux_tariff, from_dt, to_dt)
+    assert [p.split(' ')[-2] for p in points] == ['p/kWh_exc_vat=37.9043'] * 2
+    row.update(value_exc_vat=float('nan'))
+    assert octo2influx.std_unit_rate_to_points('octopus-tariffs', row, "standard-unit-rates", "p/kWh", flux_tariff, from_dt, to_dt) == []
+
+def test_consumption_to_point_missing_consumption(example_usages):
+    row = {'consumption': None, 'interval_start': '2023-12-19T04:30:00Z', 'interval_end': '2023-12-19T05:00:00Z'}
+    point = octo2influx.consumption_to_point('octopus-usage', row, example_usages[0])
+    assert point.split(' ')[-2] == 'interval_end=1702962000,interval_start=1702960200'